@@ -7,55 +7,63 @@ I used this script to find all the qualified personnel references on 250904. Thi
 :created: 2025-09-04
 """
 
-from re import L
-import sys
-
-import os
-from pathlib import Path
+import re
+import zipfile
 from collections.abc import Iterator
-import datetime
-from docx2python import docx2python
-import filecmp
-from docx2python.iterators import iter_paragraphs
+from pathlib import Path
+
+from unit_track_content_changes.update_content_dir import iter_manual_files
 
-_MANUAL_DIR = Path(__file__).parents[1]
-_CONTENT_DIR = Path(__file__).parent / "docx_content"
-_CONTENT_HISTORY_DIR = Path(__file__).parent / "docx_content_history"
-_CHANGELOG = Path(__file__).parent / "changelog.txt"
+# every line that mentions qualified, qualification, etc.
+_QUALIF_LINE = re.compile(r"^.*qualif.*$", re.IGNORECASE | re.MULTILINE)
 
-for dir in (_CONTENT_DIR, _CONTENT_HISTORY_DIR):
-    dir.mkdir(exist_ok=True)
+# docx parts that end up in docx2python's doc.text
+_TEXT_PARTS = re.compile(r"word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml")
+_XML_TAG = re.compile(rb"<[^>]*>")
+_QUALIF = re.compile(rb"qualif", re.IGNORECASE)
+
+
+def _has_keyword(manual_file: Path) -> bool:
+    """Check the raw docx xml for qualif before paying for a docx2python parse.
+
+    Search the raw xml, which includes attributes such as the image alt text
+    (`descr`) that docx2python adds to doc.text. Then search with tags stripped
+    so a word split across runs still matches. Stripping also joins text across
+    paragraph boundaries, which can only cause a false positive.
+    """
+    with zipfile.ZipFile(manual_file) as docx:
+        for name in docx.namelist():
+            if not _TEXT_PARTS.fullmatch(name):
+                continue
+            raw = docx.read(name)
+            if _QUALIF.search(raw) or _QUALIF.search(_XML_TAG.sub(b"", raw)):
+                return True
+    return False
 
-def _iter_manual_files() -> Iterator[Path]:
-    for manual_file in _MANUAL_DIR.glob('HSE*.docx'):
-        yield manual_file
 
 def _extract_file_content(manual_file: Path) -> Iterator[str]:
     """Extract the content from a manual file."""
-    title_yielded = False
+    from docx2python import docx2python  # noqa: PLC0415 heavy, only for extraction
+
     with docx2python(manual_file) as doc:
-        content = doc.body_pars
-    pars = iter_paragraphs(content)
-    pars = (p for p in pars if any("qualif" in s for s in p.run_strings))
-    for par in pars:
-        if not title_yielded:
-            yield f"# {manual_file.name}"
-            title_yielded = True
-        yield "".join(par.run_strings).strip()
+        text = doc.text
+    matches = _QUALIF_LINE.findall(text)
+    if matches:
+        yield f"# {manual_file.name}"
+        yield from (m.strip() for m in matches)
+
 
 def _extract_hse_manual_content() -> Iterator[str]:
-    """Extract the content from the manual files to the _CONTENT_DIR."""
-    for manual_file in _iter_manual_files():
-        yield from _extract_file_content(manual_file)
+    """Extract every line that mentions qualif from the manual files."""
+    for manual_file in iter_manual_files():
+        if _has_keyword(manual_file):
+            yield from _extract_file_content(manual_file)
+
 
 def main():
     lines = _extract_hse_manual_content()
     breakpoint()
-     
+
 
 if __name__ == "__main__":
     main()
-
-
-
-
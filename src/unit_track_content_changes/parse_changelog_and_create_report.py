@@ -4,37 +4,44 @@
 :created: 2025-08-18
 """
 
-from pathlib import Path
+import csv
+import io
 import re
+import sys
+from collections import defaultdict
+from pathlib import Path
 
 _LOG = Path(__file__).parent / "changelog.txt"
 
 
-
 def map_changes_to_filenames() -> dict[str, list[str]]:
     """Map changes to filenames from the changelog.
 
     :return: {filename: [list of changes]}
     """
-    filename2changes: dict[str, list[str]] = {}
-    with _LOG.open("r", encoding = 'utf-8') as log_file:
-        log_entries = log_file.readlines()
-    for entry in log_entries[1:]:
-        filename, _, content = (x.strip() for x in entry.split("\t"))
-        filename2changes.setdefault(filename, []).append(content)
-    return filename2changes
+    filename2changes: defaultdict[str, list[str]] = defaultdict(list)
+    with _LOG.open("r", encoding="utf-8", newline="") as log_file:
+        # QUOTE_NONE: entries may hold literal double quotes
+        reader = csv.reader(log_file, delimiter="\t", quoting=csv.QUOTE_NONE)
+        _ = next(reader, None)  # skip the first entry
+        for row in reader:
+            filename, _, content = (x.strip() for x in row)
+            filename2changes[filename].append(content)
+    return dict(filename2changes)
+
 
 def print_changes_report(changes: dict[str, list[str]]) -> None:
     """Print a report of changes.
 
     :param changes: {filename: [list of changes]}
     """
-    blocks: list[str] = []
-    for k, v in changes.items():
-        block = f"{k}:\n" + "\n".join(f"  - {change}" for change in v)
-        blocks.append(block)
-    report = "\n\n".join(sorted(blocks))
-    print(report)
+    report = io.StringIO()
+    for i, k in enumerate(sorted(changes)):
+        if i:
+            _ = report.write("\n")
+        _ = report.write(f"{k}:\n")
+        report.writelines(f"  - {change}\n" for change in changes[k])
+    _ = sys.stdout.write(report.getvalue())
 
 
 if __name__ == "__main__":
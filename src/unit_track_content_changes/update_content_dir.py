@@ -5,16 +5,17 @@
 """
 
 import datetime
-import filecmp
+import hashlib
+import json
+import mmap
+import os
 import shutil
-import subprocess
 import sys
 import tempfile
 from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-from docx2python import docx2python
-
 _PROJECT_DIR = Path(__file__).parents[2]
 _MANUAL_DIR = (
     Path.home()
@@ -26,34 +27,69 @@ _MANUAL_DIR = (
 )
 
 _HISTORY = _PROJECT_DIR / "history" / "docx_content_history"
+_BLOBS = _HISTORY / "blobs"
+_LAST_SEEN = _HISTORY / "last_seen.json"
 _CHANGELOG = _PROJECT_DIR / "output" / "changelog.txt"
 
+# each snapshot written since blobs were introduced holds only this file
+_MANIFEST = "manifest.tsv"
 
-def _gvim_diff(text_file_a: Path, text_file_b: Path) -> None:
-    """Open Vim in diff mode to compare two files.
 
-    :param file1: Path to the first text file
-    :param file2: Path to the second text file
-    :raises FileNotFoundError: If either file does not exist
-    """
-    if not text_file_a.exists():
-        msg = f"file not found: {text_file_a}"
-        raise FileNotFoundError(msg)
-    if not text_file_b.exists():
-        msg = f"file not found: {text_file_b}"
-        raise FileNotFoundError(msg)
+def _vim_string(path: Path) -> str:
+    """Quote a resolved path as a Vim single-quoted string literal."""
+    return "'" + str(path.resolve()).replace("'", "''") + "'"
+
 
-    file1_path = str(text_file_a.resolve())
-    file2_path = str(text_file_b.resolve())
-    _ = subprocess.run(["gvim", "-d", file1_path, file2_path], check=True)
+def _gvim_diff(diff_pairs: list[tuple[Path, Path]]) -> None:
+    """Open one Vim session with a diff tab for each pair of files.
 
+    Vim accepts at most ten -c commands, so the tabs are opened from a sourced
+    script. -f keeps gvim in the foreground until the session is closed. Each b
+    is a file from history, so its pane is opened read-only.
 
-def _iter_manual_files() -> Iterator[Path]:
+    :param diff_pairs: [(text_file_a, text_file_b), ...] where b is from history
+    :raises FileNotFoundError: If any file does not exist
+    """
+    if not diff_pairs:
+        return
+    commands = ["scriptencoding utf-8"]
+    for i, (text_file_a, text_file_b) in enumerate(diff_pairs):
+        for text_file in (text_file_a, text_file_b):
+            if not text_file.exists():
+                msg = f"file not found: {text_file}"
+                raise FileNotFoundError(msg)
+        open_cmd = "tabedit" if i else "edit"
+        commands.append(
+            f"execute '{open_cmd} ' . fnameescape({_vim_string(text_file_a)})"
+        )
+        commands.append(
+            f"execute 'vert diffsplit ' . fnameescape({_vim_string(text_file_b)})"
+        )
+        commands.append("setlocal readonly nomodifiable")
+    commands.append("tabfirst")
+
+    import subprocess  # noqa: PLC0415 only needed to review a change
+
+    with tempfile.TemporaryDirectory() as script_dir:
+        script = Path(script_dir) / "diff_tabs.vim"
+        _ = script.write_text("\n".join(commands) + "\n", encoding="utf-8")
+        _ = subprocess.run(["gvim", "-f", "-S", str(script)], check=True)
+
+
+def iter_manual_files() -> Iterator[Path]:
+    """Yield every HSE manual docx file."""
     yield from _MANUAL_DIR.glob("HSE*.docx")
 
 
 def _extract_file_content(temp_dir: str, manual_file: Path) -> None:
-    """Extract the content from a manual file."""
+    """Extract the content from a manual file.
+
+    The history snapshots are docx2python `text` output (numbering, hyperlinks,
+    image alt text, headers, and footers). Any other extractor would flag every
+    manual as changed, so keep docx2python here.
+    """
+    from docx2python import docx2python  # noqa: PLC0415 heavy, only for extraction
+
     with docx2python(manual_file) as doc:
         content = doc.text
     output_file = (Path(temp_dir) / manual_file.name).with_suffix(".txt")
@@ -61,107 +97,304 @@ def _extract_file_content(temp_dir: str, manual_file: Path) -> None:
         _ = output.write(content)
 
 
-def _extract_hse_manual_content(temp_dir: str) -> None:
-    """Extract the content from the manual files to a temporary dir."""
-    for manual_file in _iter_manual_files():
-        _extract_file_content(temp_dir, manual_file)
+def _manual_signature(manual_file: Path) -> list[int]:
+    """Return [mtime_ns, size] for a manual file."""
+    stat = manual_file.stat()
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _load_last_seen() -> dict[str, list[int]]:
+    """Load {manual filename: [mtime_ns, size]} from the last successful run."""
+    if not _LAST_SEEN.exists():
+        return {}
+    return json.loads(_LAST_SEEN.read_text(encoding="utf-8"))
+
+
+def _save_last_seen(last_seen: dict[str, list[int]]) -> None:
+    """Save {manual filename: [mtime_ns, size]} for the next run."""
+    _ = _LAST_SEEN.write_text(json.dumps(last_seen, indent=2), encoding="utf-8")
+
 
+def _extract_hse_manual_content(
+    temp_dir: str, latest: dict[str, Path | None], last_seen: dict[str, list[int]]
+) -> dict[str, list[int]]:
+    """Extract the content from the manual files to a temporary dir.
 
-def _add_a_blank_entry_to_the_change_log(filename: str, msg: str = "#TODO") -> None:
-    r"""Add a blank entry to the change log.
+    A manual with the same mtime and size as the last run is not extracted
+    again. Its latest content from history is copied to the temporary dir
+    instead. Blobs are read-only, so those may be hard linked. Each remaining
+    manual is unzipped and parsed independently, so spread those over a process
+    pool.
+
+    :param temp_dir: directory to hold one text file per manual
+    :param latest: {stem: latest file or None if deleted} from _build_latest_index
+    :param last_seen: {manual filename: [mtime_ns, size]} from the last run
+    :return: {manual filename: [mtime_ns, size]} for this run
+    """
+    seen: dict[str, list[int]] = {}
+    manual_files: list[Path] = []
+    for manual_file in iter_manual_files():
+        signature = _manual_signature(manual_file)
+        seen[manual_file.name] = signature
+        previous = latest.get(manual_file.stem)
+        if previous is not None and last_seen.get(manual_file.name) == signature:
+            scratch = (Path(temp_dir) / manual_file.name).with_suffix(".txt")
+            if previous.parent == _BLOBS:
+                _archive(previous, scratch)
+            else:
+                _clone(previous, scratch)  # legacy history is not read-only
+        else:
+            manual_files.append(manual_file)
+    if not manual_files:
+        return seen
+    max_workers = min(len(manual_files), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_extract_file_content, temp_dir, f) for f in manual_files
+        ]
+        for future in futures:
+            future.result()  # re-raise any exception from the worker
+    return seen
+
+
+def _add_a_blank_entry_to_the_change_log(
+    entries: list[str], filename: str, timestamp: str, msg: str = "#TODO"
+) -> None:
+    r"""Add a blank entry to a buffer of change log entries.
 
     filename\ttimestamp\tcontent
+
+    :param entries: buffer to write to the change log with _flush_changelog
+    :param timestamp: timestamp of the snapshot that records the change
     """
-    utc = datetime.timezone.utc
-    timestamp = datetime.datetime.now(tz=utc).strftime("%Y-%m-%d_%H-%M-%S")
     entry = f"{filename}\t{timestamp}\t{msg}\n"
     _ = sys.stdout.write(entry)
+    entries.append(entry)
+
+
+def _flush_changelog(entries: list[str]) -> None:
+    """Append all buffered entries to the change log with one open."""
+    if not entries:
+        return
     with _CHANGELOG.open("a") as changelog:
-        _ = changelog.write(entry)
+        changelog.writelines(entries)
+
+
+def _hash_file(path: Path) -> str:
+    """Return the BLAKE2b-128 hex digest of a file.
+
+    Hash a read-only memory map to skip Python-level read buffering. An empty
+    file cannot be mapped, but its digest is just the digest of no bytes.
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                hasher.update(mapped)
+    return hasher.hexdigest()
+
 
+def _stored_hash(path: Path) -> str:
+    """Return the digest of a history file, reading it only if not a blob."""
+    if path.parent == _BLOBS:
+        return path.stem
+    return _hash_file(path)
 
-def _try_find_stem(dir_: Path, stem: str) -> Path | None:
-    """Try to find a file with the given stem in the given directory."""
-    candidates = list(dir_.glob(f"{stem}.*"))
-    if not candidates:
-        return None
+
+def _read_manifest(manifest: Path) -> Iterator[tuple[str, str]]:
+    r"""Yield (stem, digest) pairs from a snapshot manifest.
+
+    stem\tdigest
+    """
+    with manifest.open(encoding="utf-8") as f:
+        for line in f:
+            stem, digest = line.rstrip("\n").split("\t")
+            yield stem, digest
+
+
+def _clone(src: Path, dst: Path) -> None:
+    """Copy src to an independent file dst, moving as few bytes as possible.
+
+    Try copy_file_range (a reflink on CoW filesystems, Linux only), then a plain
+    copy. Never hard link: dst must not change when src is edited.
+    """
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is not None:
+        try:
+            with src.open("rb") as fsrc, dst.open("wb") as fdst:
+                while copy_file_range(fsrc.fileno(), fdst.fileno(), 1024 * 1024):
+                    pass
+        except OSError:
+            pass
+        else:
+            return
+    _ = shutil.copyfile(src, dst)
+
+
+def _archive(src: Path, dst: Path) -> None:
+    """Copy src to dst, moving as few bytes as the filesystem allows.
+
+    Try a hard link, then _clone. A hard link shares one file between src and
+    dst, so only use this to bring read-only blobs into scratch space, never to
+    write history from a file that may still be edited.
+    """
     try:
-        (match,) = candidates  # unpack singleton
-    except ValueError as e:
-        msg = "Ambiguous state: Multiple matches for {stem} in {dir_}"
-        raise ValueError(msg) from e
-    return match
-
-
-def _find_latest(stem: str) -> Path | None:
-    """Search backwards through history to find the latest file with the given stem."""
-    history_dirs = sorted(_HISTORY.glob("content_*"), reverse=True)
-    for history_dir in history_dirs:
-        match = _try_find_stem(history_dir, stem)
-        if match is None:
-            continue
-        if match.suffix == ".deleted":
-            return None
-        return match
-    return None
+        os.link(src, dst)
+    except OSError:
+        _clone(src, dst)
 
 
-def _collect_stems() -> set[str]:
-    """Collect the stems of all files in the history."""
-    stems: set[str] = set()
-    for dir_ in _HISTORY.glob("content_*"):
-        for file in dir_.glob("*"):
-            stems.add(file.stem)
-    return stems
+def _write_snapshot(snapshot_dir: Path, digests: dict[Path, str]) -> None:
+    """Store new blobs and write a manifest of the full current state.
 
+    Blobs are named by digest and never rewritten, so each is a read-only copy.
+    The manifest is written to a staging directory and renamed into place, so an
+    interrupted run never leaves a partial snapshot in history.
 
-def _collect_existing_stems() -> set[str]:
+    :param snapshot_dir: content_<timestamp> directory to create
+    :param digests: {extracted content file: digest} for every current file
+    """
+    _BLOBS.mkdir(parents=True, exist_ok=True)
+    for file, digest in digests.items():
+        blob = _BLOBS / f"{digest}.txt"
+        if blob.exists():
+            continue
+        # an independent, read-only copy, so nothing saved later can change a blob
+        partial = blob.with_suffix(".partial")
+        if partial.exists():  # read-only leftover of an interrupted run
+            partial.chmod(0o644)
+        partial.unlink(missing_ok=True)
+        _clone(file, partial)
+        partial.chmod(0o444)
+        _ = partial.replace(blob)
+    staging = snapshot_dir.with_name(f"staging_{snapshot_dir.name}")
+    staging.mkdir()
+    lines = sorted(f"{f.stem}\t{d}\n" for f, d in digests.items())
+    with (staging / _MANIFEST).open("w", encoding="utf-8") as manifest:
+        manifest.writelines(lines)
+    _ = staging.rename(snapshot_dir)
+
+
+def _build_latest_index() -> dict[str, Path | None]:
+    """Map each stem in history to its latest file.
+
+    Walk history once, newest snapshot first, and keep the first file found for
+    each stem. Stems whose latest file is a `.deleted` marker map to None.
+
+    A snapshot with a manifest records the full state at that time, so the walk
+    stops there and each stem maps to its blob. Older snapshots hold whole text
+    files and `.deleted` markers.
+
+    :return: {stem: latest file or None if deleted}
+    :raises ValueError: If a snapshot holds more than one file for a stem
+    """
+    latest: dict[str, Path | None] = {}
+    with os.scandir(_HISTORY) as entries:
+        history_dirs = [
+            e.path for e in entries if e.name.startswith("content_") and e.is_dir()
+        ]
+    for history_dir in sorted(history_dirs, reverse=True):
+        manifest = Path(history_dir) / _MANIFEST
+        if manifest.exists():
+            for stem, digest in _read_manifest(manifest):
+                _ = latest.setdefault(stem, _BLOBS / f"{digest}.txt")
+            break
+        seen: set[str] = set()
+        with os.scandir(history_dir) as entries:
+            for entry in entries:
+                stem, suffix = os.path.splitext(entry.name)  # noqa: PTH122
+                if stem in seen:
+                    msg = (
+                        f"Ambiguous state: Multiple matches for {stem} in {history_dir}"
+                    )
+                    raise ValueError(msg)
+                seen.add(stem)
+                if stem not in latest:
+                    latest[stem] = None if suffix == ".deleted" else Path(entry.path)
+    return latest
+
+
+def _collect_existing_stems(latest: dict[str, Path | None]) -> set[str]:
     """List all files that SHOULD BE present in the HSE manual.
 
     If a file is missing, mark the change that it was deleted.
+
+    :param latest: {stem: latest file or None if deleted} from _build_latest_index
+    """
+    return {stem for stem, path in latest.items() if path is not None}
+
+
+def _compare_with_state(content_files: str, latest: dict[str, Path | None]) -> None:
+    """Compare content files with latest state in history.
+
+    :param content_files: directory holding one text file per manual
+    :param latest: {stem: latest file or None if deleted} from _build_latest_index
     """
-    stems = _collect_stems()
-    for stem in tuple(stems):
-        latest = _find_latest(stem)
-        if latest is None:
-            msg = "Stem {stem} is present in history but not found. This is a bug."
-            raise RuntimeError(msg)
-        if latest.suffix == ".deleted":
-            stems.remove(stem)
-    return stems
-
-
-def _compare_with_state(content_files: str) -> None:
-    """Compare content files with latest state in history."""
     new = Path(content_files)
     utc = datetime.timezone.utc
     timestamp = datetime.datetime.now(tz=utc).strftime("%Y-%m-%d_%H-%M-%S")
     changes = _HISTORY / f"content_{timestamp}"
-    for new_file in new.glob("*"):
-        old_file = _find_latest(new_file.stem)
+    new_digests = {x: _hash_file(x) for x in new.glob("*")}
+    entries: list[str] = []
+    diff_pairs: list[tuple[Path, Path]] = []
+    for new_file, new_digest in new_digests.items():
+        old_file = latest.get(new_file.stem)
         if old_file is None:
-            _add_a_blank_entry_to_the_change_log(new_file.stem, "file added")
-            changes.mkdir(exist_ok=True)
-            _ = shutil.copy(new_file, changes / new_file.name)
-        elif not filecmp.cmp(old_file, new_file):
-            _add_a_blank_entry_to_the_change_log(old_file.stem)
-            changes.mkdir(exist_ok=True)
-            _ = shutil.copy(new_file, changes / new_file.name)
-            _gvim_diff(new_file, old_file)
-
-    old_stems = _collect_existing_stems()
-    new_stems = {x.stem for x in new.glob("*")}
+            _add_a_blank_entry_to_the_change_log(
+                entries, new_file.stem, timestamp, "file added"
+            )
+        elif _stored_hash(old_file) != new_digest:
+            _add_a_blank_entry_to_the_change_log(entries, new_file.stem, timestamp)
+            diff_pairs.append((new_file, old_file))
+
+    old_stems = _collect_existing_stems(latest)
+    new_stems = {x.stem for x in new_digests}
     for name in old_stems - new_stems:
-        _add_a_blank_entry_to_the_change_log(name, "file removed")
-        changes.mkdir(exist_ok=True)
-        (changes / name).with_suffix(".deleted").touch()
+        _add_a_blank_entry_to_the_change_log(entries, name, timestamp, "file removed")
+
+    _flush_changelog(entries)
+    # snapshot before review: new_digests must match what goes into each blob
+    if entries:
+        _write_snapshot(changes, new_digests)
+    _gvim_diff(diff_pairs)
+
+
+def _ensure_dirs() -> None:
+    """Create the history and output dirs if they do not exist."""
+    for dir_ in (_HISTORY, _CHANGELOG.parent):
+        dir_.mkdir(parents=True, exist_ok=True)
+
+
+def _prune_history() -> None:
+    """Remove what interrupted or empty runs left in history.
+
+    That is staging directories never renamed into place, blobs never renamed
+    from .partial, and empty snapshot directories.
+    """
+    with os.scandir(_HISTORY) as entries:
+        history_dirs = [(e.name, e.path) for e in entries if e.is_dir()]
+    for name, history_dir in history_dirs:
+        if name.startswith("staging_"):
+            shutil.rmtree(history_dir)
+        elif name.startswith("content_"):
+            with os.scandir(history_dir) as contents:
+                is_empty = next(contents, None) is None
+            if is_empty:
+                os.rmdir(history_dir)  # noqa: PTH106
+    for partial in _BLOBS.glob("*.partial"):
+        partial.unlink()
 
 
 def main() -> None:
     """Identify and record changes to the HSE manual content."""
+    _ensure_dirs()
+    _prune_history()
+    latest = _build_latest_index()
+    last_seen = _load_last_seen()
     with tempfile.TemporaryDirectory() as temp_dir:
-        _extract_hse_manual_content(temp_dir)
-        _compare_with_state(temp_dir)
+        seen = _extract_hse_manual_content(temp_dir, latest, last_seen)
+        _compare_with_state(temp_dir, latest)
+    _save_last_seen(seen)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,44 @@
+"""Test the zip-level keyword pre-filter in find_qualified.
+
+:author: Shay Hill
+:created: 2026-10-15
+"""
+
+from __future__ import annotations
+
+import zipfile
+from typing import TYPE_CHECKING
+
+import pytest
+
+from unit_track_content_changes.find_qualified import _has_keyword
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def _write_docx(path: Path, part: str, body: str) -> Path:
+    with zipfile.ZipFile(path, "w") as docx:
+        docx.writestr(part, f"<w:document><w:body>{body}</w:body></w:document>")
+    return path
+
+
+@pytest.mark.parametrize(
+    ("part", "body", "expect"),
+    [
+        ("word/document.xml", "<w:p><w:r><w:t>Qualified</w:t></w:r></w:p>", True),
+        (
+            "word/document.xml",
+            "<w:p><w:r><w:t>qual</w:t></w:r><w:r><w:t>ified</w:t></w:r></w:p>",
+            True,
+        ),
+        ("word/document.xml", '<w:p><wp:docPr descr="qualified rigger"/></w:p>', True),
+        ("word/footer2.xml", "<w:p><w:r><w:t>qualified</w:t></w:r></w:p>", True),
+        ("word/styles.xml", "<w:p><w:r><w:t>qualified</w:t></w:r></w:p>", False),
+        ("word/document.xml", "<w:p><w:r><w:t>competent</w:t></w:r></w:p>", False),
+    ],
+)
+def test_has_keyword(tmp_path: Path, part: str, body: str, *, expect: bool) -> None:
+    """Match text split across runs and alt text, only in text parts."""
+    docx = _write_docx(tmp_path / "HSE - test.docx", part, body)
+    assert _has_keyword(docx) is expect
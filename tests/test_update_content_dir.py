@@ -0,0 +1,320 @@
+"""Test the history index and snapshots written by update_content_dir.
+
+:author: Shay Hill
+:created: 2026-10-15
+"""
+
+from __future__ import annotations
+
+import hashlib
+import stat
+from pathlib import Path
+
+import pytest
+
+from unit_track_content_changes import update_content_dir as ucd
+
+_OLD = "content_2025-01-01_00-00-00"
+_DELETED = "content_2025-02-01_00-00-00"
+_NEWEST = "content_2025-03-01_00-00-00"
+
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def _is_read_only(path: Path) -> bool:
+    return not stat.S_IMODE(path.stat().st_mode) & 0o222
+
+
+@pytest.fixture
+def history(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Point update_content_dir at an empty history in a temporary dir."""
+    history = tmp_path / "history"
+    history.mkdir()
+    monkeypatch.setattr(ucd, "_HISTORY", history)
+    monkeypatch.setattr(ucd, "_BLOBS", history / "blobs")
+    monkeypatch.setattr(ucd, "_LAST_SEEN", history / "last_seen.json")
+    monkeypatch.setattr(ucd, "_CHANGELOG", tmp_path / "output" / "changelog.txt")
+    ucd._CHANGELOG.parent.mkdir()
+    return history
+
+
+@pytest.fixture
+def legacy_history(history: Path) -> Path:
+    """Write one snapshot of text files, then one with a .deleted marker.
+
+    a, b, and c are added. Then a changes and c is deleted.
+    """
+    old = history / _OLD
+    old.mkdir()
+    _ = (old / "a.txt").write_text("a 1")
+    _ = (old / "b.txt").write_text("b 1")
+    _ = (old / "c.txt").write_text("c 1")
+    deleted = history / _DELETED
+    deleted.mkdir()
+    _ = (deleted / "a.txt").write_text("a 2")
+    (deleted / "c.deleted").touch()
+    return history
+
+
+@pytest.fixture
+def manifest_history(legacy_history: Path) -> Path:
+    """Add a manifest snapshot on top of the legacy history.
+
+    b is removed, so it is absent from the manifest.
+    """
+    blobs = legacy_history / "blobs"
+    blobs.mkdir()
+    _ = (blobs / f"{_digest('a 2')}.txt").write_text("a 2")
+    newest = legacy_history / _NEWEST
+    newest.mkdir()
+    _ = (newest / "manifest.tsv").write_text(f"a\t{_digest('a 2')}\n")
+    return legacy_history
+
+
+def _write_content(content_dir: Path, **texts: str) -> None:
+    for stem, text in texts.items():
+        _ = (content_dir / f"{stem}.txt").write_text(text)
+
+
+def _changelog_entries() -> list[tuple[str, str]]:
+    lines = ucd._CHANGELOG.read_text().splitlines()
+    return sorted((x.split("\t")[0], x.split("\t")[2]) for x in lines)
+
+
+def _new_snapshot(history: Path) -> Path:
+    (snapshot,) = (
+        x for x in history.glob("content_*") if x.name not in {_OLD, _DELETED, _NEWEST}
+    )
+    return snapshot
+
+
+class TestBuildLatestIndex:
+    def test_legacy_snapshots(self, legacy_history: Path) -> None:
+        """Read text files and .deleted markers, newest snapshot first."""
+        assert ucd._build_latest_index() == {
+            "a": legacy_history / _DELETED / "a.txt",
+            "b": legacy_history / _OLD / "b.txt",
+            "c": None,
+        }
+
+    def test_manifest_stops_walk(self, manifest_history: Path) -> None:
+        """Map to blobs and ignore snapshots older than the newest manifest."""
+        blob = manifest_history / "blobs" / f"{_digest('a 2')}.txt"
+        assert ucd._build_latest_index() == {"a": blob}
+
+    def test_ambiguous_stem(self, history: Path) -> None:
+        """Raise ValueError if a snapshot holds two files for one stem."""
+        snapshot = history / _OLD
+        snapshot.mkdir()
+        _ = (snapshot / "a.txt").write_text("a 1")
+        (snapshot / "a.deleted").touch()
+        with pytest.raises(ValueError, match="Ambiguous"):
+            _ = ucd._build_latest_index()
+
+
+class TestPruneHistory:
+    def test_prune_interrupted_runs(self, manifest_history: Path) -> None:
+        """Remove staging dirs, partial blobs, and empty snapshots anywhere."""
+        staging = manifest_history / f"staging_{_NEWEST}"
+        staging.mkdir()
+        _ = (staging / "manifest.tsv").write_text("a\tpartial\n")
+        partial = manifest_history / "blobs" / "partial.partial"
+        _ = partial.write_text("partial")
+        partial.chmod(0o444)
+        empty = manifest_history / "content_2024-01-01_00-00-00"
+        empty.mkdir()
+
+        ucd._prune_history()
+
+        assert sorted(x.name for x in manifest_history.iterdir()) == [
+            "blobs",
+            _OLD,
+            _DELETED,
+            _NEWEST,
+        ]
+        assert [x.suffix for x in (manifest_history / "blobs").iterdir()] == [".txt"]
+
+
+class TestCompareWithState:
+    def test_from_legacy_history(
+        self,
+        legacy_history: Path,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        """Log changes and write a full-state manifest and read-only blobs."""
+        diffs: list[list[tuple[Path, Path]]] = []
+        monkeypatch.setattr(ucd, "_gvim_diff", diffs.append)
+        content = tmp_path / "content"
+        content.mkdir()
+        _write_content(content, a="a 3", c="c 2", d="d 1")
+
+        ucd._compare_with_state(str(content), ucd._build_latest_index())
+
+        assert _changelog_entries() == [
+            ("a", "#TODO"),
+            ("b", "file removed"),
+            ("c", "file added"),
+            ("d", "file added"),
+        ]
+        snapshot = _new_snapshot(legacy_history)
+        assert [x.name for x in snapshot.iterdir()] == ["manifest.tsv"]
+        assert (snapshot / "manifest.tsv").read_text() == "".join(
+            f"{k}\t{_digest(v)}\n"
+            for k, v in (("a", "a 3"), ("c", "c 2"), ("d", "d 1"))
+        )
+        assert not list(legacy_history.glob("staging_*"))
+        for text in ("a 3", "c 2", "d 1"):
+            blob = legacy_history / "blobs" / f"{_digest(text)}.txt"
+            assert blob.read_text() == text
+            assert _is_read_only(blob)
+        assert diffs == [[(content / "a.txt", legacy_history / _DELETED / "a.txt")]]
+
+    def test_stale_partial_blob(
+        self, history: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Replace a read-only .partial left by an interrupted run."""
+        monkeypatch.setattr(ucd, "_gvim_diff", lambda _: None)
+        partial = history / "blobs" / f"{_digest('a 1')}.partial"
+        partial.parent.mkdir()
+        _ = partial.write_text("a")
+        partial.chmod(0o444)
+        content = tmp_path / "content"
+        content.mkdir()
+        _write_content(content, a="a 1")
+
+        ucd._compare_with_state(str(content), ucd._build_latest_index())
+
+        assert not partial.exists()
+        assert partial.with_suffix(".txt").read_text() == "a 1"
+
+    def test_from_manifest(
+        self,
+        manifest_history: Path,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        """Treat stems absent from the newest manifest as removed."""
+        monkeypatch.setattr(ucd, "_gvim_diff", lambda _: None)
+        content = tmp_path / "content"
+        content.mkdir()
+        _write_content(content, a="a 2", b="b 1")
+
+        ucd._compare_with_state(str(content), ucd._build_latest_index())
+
+        assert _changelog_entries() == [("b", "file added")]
+
+    def test_no_change(
+        self,
+        manifest_history: Path,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        """Write nothing when the content matches the newest manifest."""
+        monkeypatch.setattr(ucd, "_gvim_diff", lambda _: None)
+        content = tmp_path / "content"
+        content.mkdir()
+        _write_content(content, a="a 2")
+
+        ucd._compare_with_state(str(content), ucd._build_latest_index())
+
+        assert not ucd._CHANGELOG.exists()
+        assert len(list(manifest_history.glob("content_*"))) == 3
+
+    def test_edit_during_review(
+        self,
+        legacy_history: Path,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        """Keep each blob equal to its name if content is saved during review."""
+
+        def edit_new_files(diff_pairs: list[tuple[Path, Path]]) -> None:
+            for new_file, _ in diff_pairs:
+                with new_file.open("w") as f:
+                    _ = f.write("edited")
+
+        monkeypatch.setattr(ucd, "_gvim_diff", edit_new_files)
+        content = tmp_path / "content"
+        content.mkdir()
+        _write_content(content, a="a 3", b="b 1")
+
+        ucd._compare_with_state(str(content), ucd._build_latest_index())
+
+        assert (content / "a.txt").read_text() == "edited"
+        for blob in (legacy_history / "blobs").iterdir():
+            assert _digest(blob.read_text()) == blob.stem
+
+
+def _fake_extract(temp_dir: str, manual_file: Path) -> None:
+    """Stand in for docx2python. Runs in a worker process, so module level."""
+    output_file = (Path(temp_dir) / manual_file.name).with_suffix(".txt")
+    _ = output_file.write_text(f"content of {manual_file.name}")
+
+
+def _fail_extract(temp_dir: str, manual_file: Path) -> None:
+    msg = f"extracted {manual_file.name} from {temp_dir}"
+    raise AssertionError(msg)
+
+
+class TestMain:
+    def test_skip_unchanged_manuals(
+        self, history: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Reuse read-only history for manuals not modified since the last run."""
+        manuals = tmp_path / "manuals"
+        manuals.mkdir()
+        for name in ("HSE - a.docx", "HSE - b.docx"):
+            _ = (manuals / name).write_bytes(b"docx")
+        monkeypatch.setattr(
+            ucd, "iter_manual_files", lambda: iter(sorted(manuals.iterdir()))
+        )
+        diffs: list[list[tuple[Path, Path]]] = []
+        monkeypatch.setattr(ucd, "_gvim_diff", diffs.append)
+
+        monkeypatch.setattr(ucd, "_extract_file_content", _fake_extract)
+        ucd.main()
+        assert _changelog_entries() == [
+            ("HSE - a", "file added"),
+            ("HSE - b", "file added"),
+        ]
+        assert ucd._LAST_SEEN.exists()
+
+        compare_with_state = ucd._compare_with_state
+        scratch: list[Path] = []
+
+        def check_scratch(content_files: str, latest: dict[str, Path | None]) -> None:
+            scratch.extend(Path(content_files).iterdir())
+            for file in scratch:
+                assert _is_read_only(file)
+            compare_with_state(content_files, latest)
+
+        monkeypatch.setattr(ucd, "_extract_file_content", _fail_extract)
+        monkeypatch.setattr(ucd, "_compare_with_state", check_scratch)
+        ucd.main()
+        assert len(scratch) == 2
+        assert len(_changelog_entries()) == 2
+        assert len(list(history.glob("content_*"))) == 1
+        assert diffs == [[], []]
+
+    def test_skip_from_legacy_history(
+        self, legacy_history: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """Copy legacy text files reused as content and leave them as they were."""
+        manuals = tmp_path / "manuals"
+        manuals.mkdir()
+        manual = manuals / "a.docx"
+        _ = manual.write_bytes(b"docx")
+        ucd._save_last_seen({"a.docx": ucd._manual_signature(manual)})
+        monkeypatch.setattr(ucd, "iter_manual_files", lambda: iter([manual]))
+        monkeypatch.setattr(ucd, "_extract_file_content", _fail_extract)
+        monkeypatch.setattr(ucd, "_gvim_diff", lambda _: None)
+        legacy_file = legacy_history / _DELETED / "a.txt"
+        mode = legacy_file.stat().st_mode
+
+        ucd.main()
+
+        assert _changelog_entries() == [("b", "file removed")]
+        assert legacy_file.stat().st_mode == mode